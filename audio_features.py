@@ -0,0 +1,202 @@
+import librosa
+import numpy as np
+import shutil
+import subprocess
+import soundfile as sf
+from scipy.fft import dct, rfft
+from scipy.signal import get_window
+from typing import Optional
+
+# --- Feature Parameters (shared by train_model.py and risk_scorer.py) ---
+TARGET_DURATION = 3.0
+N_MFCC = 40  # Number of MFCCs to extract
+# Setting a high sample rate ensures quality but requires more memory
+SAMPLE_RATE = 22050
+N_FFT = 2048
+HOP_LENGTH = 512
+N_MELS = 128
+N_CHROMA = 12
+
+# Feature vector layout: [MFCC mean, std | chroma mean, std | mel mean, std]
+FEATURE_DIM = 2 * (N_MFCC + N_CHROMA + N_MELS)
+MFCC_MEAN = slice(0, N_MFCC)
+MFCC_STD = slice(MFCC_MEAN.stop, MFCC_MEAN.stop + N_MFCC)
+CHROMA_MEAN = slice(MFCC_STD.stop, MFCC_STD.stop + N_CHROMA)
+CHROMA_STD = slice(CHROMA_MEAN.stop, CHROMA_MEAN.stop + N_CHROMA)
+MEL_MEAN = slice(CHROMA_STD.stop, CHROMA_STD.stop + N_MELS)
+MEL_STD = slice(MEL_MEAN.stop, MEL_MEAN.stop + N_MELS)
+
+# Mel filterbank and orthonormal DCT-II basis are fixed for our SAMPLE_RATE/N_FFT/N_MELS/N_MFCC,
+# so build them once instead of on every librosa.feature call
+MEL_BASIS = librosa.filters.mel(sr=SAMPLE_RATE, n_fft=N_FFT, n_mels=N_MELS)
+DCT_BASIS = dct(np.eye(N_MELS), type=2, norm='ortho', axis=0)[:N_MFCC]
+# Periodic Hann window, as used by librosa.stft
+STFT_WINDOW = get_window('hann', N_FFT, fftbins=True).astype(np.float32)
+
+
+def power_spectrogram(audio, workers=None):
+    """|STFT|^2 of audio, equivalent to librosa.stft(center=True) with N_FFT/HOP_LENGTH, via a real FFT."""
+    # Centre the frames the way librosa does (zero padding of N_FFT // 2 on both sides)
+    padded = np.pad(audio, N_FFT // 2)
+    frames = librosa.util.frame(padded, frame_length=N_FFT, hop_length=HOP_LENGTH)
+    return np.abs(rfft(frames * STFT_WINDOW[:, None], axis=0, workers=workers)) ** 2
+
+
+def mean_std(x):
+    """Per-row mean and standard deviation of a (features, frames) array, without transposing."""
+    m = x.mean(axis=1)
+    s = np.sqrt(((x - m[:, None]) ** 2).mean(axis=1))
+    return m, s
+
+
+def compute_features(audio, sr=SAMPLE_RATE, out=None, workers=None):
+    """Computes the FEATURE_DIM float32 feature vector (MFCC, chroma, mel mean/std) of an audio clip.
+
+    If given, out must be a float32 array of length FEATURE_DIM; the features are written into it.
+    """
+    if sr != SAMPLE_RATE:
+        # MEL_BASIS was built for SAMPLE_RATE
+        raise ValueError(f"Expected audio at {SAMPLE_RATE} Hz, got {sr} Hz")
+    if out is None:
+        out = np.empty(FEATURE_DIM, dtype=np.float32)
+
+    # Compute the power spectrogram once and share it across all features
+    S = power_spectrogram(audio, workers=workers)
+
+    # 1. Mel Spectrogram (representation of sound)
+    mel = MEL_BASIS @ S
+    out[MEL_MEAN], out[MEL_STD] = mean_std(mel)
+
+    # 2. MFCCs (Mel-Frequency Cepstral Coefficients), derived from the same mel spectrogram
+    mfccs = DCT_BASIS @ librosa.power_to_db(mel)
+    out[MFCC_MEAN], out[MFCC_STD] = mean_std(mfccs)
+
+    # 3. Chroma (measures intensity of pitches)
+    # Left to librosa: chroma_stft estimates tuning per clip, so its filterbank cannot be cached
+    chroma = librosa.feature.chroma_stft(S=S, sr=sr)
+    out[CHROMA_MEAN], out[CHROMA_STD] = mean_std(chroma)
+
+    return out
+
+
+def convert_to_wav(input_path: str, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+    """Decodes any ffmpeg-readable file to mono float32 PCM at sample_rate, entirely in memory."""
+    # Fast path: already a mono WAV at the target rate, so read it without spawning ffmpeg
+    try:
+        info = sf.info(input_path)
+        if info.format == 'WAV' and info.samplerate == sample_rate and info.channels == 1:
+            audio, _ = sf.read(input_path, dtype='float32')
+            return audio
+    except Exception:
+        # Not something libsndfile understands (e.g. WebM/OGG Opus); let ffmpeg handle it
+        pass
+
+    try:
+        # If ffmpeg is on PATH, use that.
+        ffmpeg_cmd = shutil.which("ffmpeg")
+
+        # Stream raw 16-bit PCM to stdout instead of writing an intermediate file
+        result = subprocess.run([
+            ffmpeg_cmd, "-y",
+            "-i", input_path,
+            "-f", "s16le",
+            "-ar", str(sample_rate),
+            "-ac", "1",
+            "-"
+        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+        if result.returncode != 0:
+            print("FFmpeg error:", result.stderr.decode(errors="replace"))
+            return None
+
+        return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+    except Exception as e:
+        print("FFmpeg conversion failed:", e)
+        return None
+
+
+def extract_features_for_inference(file_path: str, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
+    """Extracts features from a single new audio file."""
+    try:
+        # Decode WebM/OGG → PCM at the target sample rate
+        audio = convert_to_wav(file_path, sample_rate)
+        if audio is None:
+            print("Audio conversion failed")
+            return None
+
+        sr = sample_rate
+        # Pad or trim audio to exactly TARGET_DURATION
+        required_len = int(TARGET_DURATION * sample_rate)
+        if len(audio) < required_len:
+            audio = np.pad(audio, (0, required_len - len(audio)))
+        else:
+            audio = audio[:required_len]
+        
+        # Write the features straight into one preallocated float32 row
+        # (float32 keeps the scaler/MLP math in fp32). The FFT stays single-threaded:
+        # this runs in one of several scoring processes, which already cover the cores
+        features = np.empty((1, FEATURE_DIM), dtype=np.float32)
+        compute_features(audio, sr, out=features[0])
+        
+        # Already shaped for single prediction (1 sample, N features)
+        return features
+        
+    except Exception as e:
+        # If audio fails (e.g., missing FFmpeg), return None so we can fallback to text
+        print(f"Feature extraction failed: {e}")
+        return None
+
+
+def warmup_feature_extraction():
+    """Runs the librosa feature path once on synthetic audio so numba JIT compilation happens up front."""
+    dummy = np.random.default_rng(0).standard_normal(int(TARGET_DURATION * SAMPLE_RATE)).astype(np.float32)
+    compute_features(dummy)
+
+
+def reference_features(audio, sr=SAMPLE_RATE):
+    """The original all-librosa feature extraction, kept to check compute_features against."""
+    mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=N_MFCC)
+    chroma = librosa.feature.chroma_stft(y=audio, sr=sr)
+    mel = librosa.feature.melspectrogram(y=audio, sr=sr)
+    return np.hstack([
+        np.mean(mfccs.T, axis=0), np.std(mfccs.T, axis=0),
+        np.mean(chroma.T, axis=0), np.std(chroma.T, axis=0),
+        np.mean(mel.T, axis=0), np.std(mel.T, axis=0)
+    ])
+
+
+def check_against_librosa(n_clips=5, seed=0):
+    """Checks the hand-written feature path against librosa on synthetic 3.0s clips.
+
+    Raises AssertionError on any mismatch; the trained model is only valid if they agree.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(TARGET_DURATION * SAMPLE_RATE)
+    t = np.arange(n_samples) / SAMPLE_RATE
+    for _ in range(n_clips):
+        # Random tones plus noise so chroma, mel and MFCC all carry signal
+        freqs = rng.uniform(80, 4000, size=3)
+        audio = sum(np.sin(2 * np.pi * f * t) for f in freqs) + 0.1 * rng.standard_normal(n_samples)
+        audio = (audio / np.abs(audio).max()).astype(np.float32)
+
+        S = power_spectrogram(audio)
+        S_ref = np.abs(librosa.stft(audio, n_fft=N_FFT, hop_length=HOP_LENGTH)) ** 2
+        np.testing.assert_allclose(S, S_ref, rtol=1e-3, atol=1e-6 * S_ref.max())
+
+        mel = MEL_BASIS @ S
+        mel_ref = librosa.feature.melspectrogram(y=audio, sr=SAMPLE_RATE)
+        np.testing.assert_allclose(mel, mel_ref, rtol=1e-3, atol=1e-6 * mel_ref.max())
+
+        mfccs = DCT_BASIS @ librosa.power_to_db(mel)
+        mfccs_ref = librosa.feature.mfcc(y=audio, sr=SAMPLE_RATE, n_mfcc=N_MFCC)
+        np.testing.assert_allclose(mfccs, mfccs_ref, rtol=1e-3, atol=1e-2)
+
+        np.testing.assert_allclose(
+            compute_features(audio), reference_features(audio), rtol=1e-3, atol=1e-3
+        )
+
+
+if __name__ == "__main__":
+    check_against_librosa()
+    print("Feature extraction matches librosa.")
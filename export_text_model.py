@@ -0,0 +1,25 @@
+from transformers import AutoTokenizer
+
+# Distilled SST-2 sentiment model served by risk_scorer.py through ONNX Runtime
+TEXT_MODEL_NAME = "distilbert-base-uncased-finetuned-sst-2-english"
+TEXT_MODEL_DIR = "text_model_onnx"
+TEXT_MODEL_FILE = "model_quantized.onnx"
+
+def export_text_model(save_dir: str = TEXT_MODEL_DIR) -> None:
+    """Exports TEXT_MODEL_NAME to ONNX and applies dynamic INT8 quantization."""
+    from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    model = ORTModelForSequenceClassification.from_pretrained(TEXT_MODEL_NAME, export=True)
+    model.save_pretrained(save_dir)
+    AutoTokenizer.from_pretrained(TEXT_MODEL_NAME).save_pretrained(save_dir)
+
+    quantizer = ORTQuantizer.from_pretrained(model)
+    qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=save_dir, quantization_config=qconfig)
+
+# Run once before starting the server (the Docker image does this at build time)
+if __name__ == "__main__":
+    print(f"Exporting {TEXT_MODEL_NAME} to INT8 ONNX...")
+    export_text_model()
+    print(f"Text model saved to {TEXT_MODEL_DIR}/{TEXT_MODEL_FILE}")
@@ -19,6 +19,7 @@ L.Marker.prototype.options.icon = DefaultIcon;
 
 const Dashboard = ({ onLogout }) => {
   const [incidents, setIncidents] = useState([]);
+  const [totalCount, setTotalCount] = useState(0);
 
   useEffect(() => {
     const fetchData = async () => {
@@ -33,6 +34,10 @@ const Dashboard = ({ onLogout }) => {
         );
         const sortedData = response.data.sort((a, b) => b.id - a.id);
         setIncidents(sortedData);
+        // The API returns the most recent page; the full count comes in a header
+        setTotalCount(
+          parseInt(response.headers['x-total-count'], 10) || sortedData.length
+        );
       } catch (error) {
         console.error('Access Denied or Error:', error);
       }
@@ -61,7 +66,7 @@ const Dashboard = ({ onLogout }) => {
           </div>
           <div className="dashboard-badge">
             <span className="dashboard-badge-dot" />
-            {incidents.length}
+            {totalCount}
           </div>
         </div>
 
@@ -109,7 +114,7 @@ const Dashboard = ({ onLogout }) => {
       <div className="dashboard-logs-section">
         <div className="logs-header">
           <h3 className="logs-title">📋 Recent Alerts</h3>
-          <span className="logs-count">{incidents.length}</span>
+          <span className="logs-count">{totalCount}</span>
         </div>
 
         <div className="logs-table-wrapper">
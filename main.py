@@ -1,14 +1,20 @@
 import os
 import shutil
+import asyncio
 import uuid
+import time
 import datetime
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime
+from sqlalchemy import create_engine, event, select, func, text, Column, Integer, String, Float, DateTime
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.exc import IntegrityError, OperationalError
 from typing import Optional
 from fastapi import Depends, status, Header
 
@@ -16,14 +22,39 @@ from fastapi import Depends, status, Header
 # We wrap this in try-except so the server doesn't crash if libraries are missing during setup
 try:
     from risk_scorer import calculate_risk_score
+    from audio_features import extract_features_for_inference, warmup_feature_extraction
 except ImportError as e:
     print(f"Warning: AI modules not found ({e}). AI scoring will be simulated.")
-    def calculate_risk_score(audio_file_path, text_input):
+    def calculate_risk_score(audio_file_path, text_input, audio_features=None):
         return "High", 0.95, {"error": "AI module missing, simulated response"}
+    extract_features_for_inference = None
+    warmup_feature_extraction = None
+
+# Audio decoding + feature extraction (the CPU-heavy part) runs in a pool of pre-warmed worker
+# processes; the models themselves stay in this process.
+# Sized per uvicorn worker: WEB_CONCURRENCY (which uvicorn also reads as its --workers default) splits
+# the cores between the uvicorn workers' pools instead of every pool taking all of them
+SCORING_WORKERS = max(1, (os.cpu_count() or 1) // int(os.environ.get("WEB_CONCURRENCY", 1)))
 
 # This creates a file 'safety.db' in your folder. No installation needed.
 SQLALCHEMY_DATABASE_URL = "sqlite:///./safety.db"
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    pool_size=20,
+    pool_pre_ping=True
+)
+
+# WAL journal + NORMAL sync: commits no longer wait for a full fsync each time
+@event.listens_for(engine, "connect")
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")
+    cursor.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -31,7 +62,7 @@ Base = declarative_base()
 class Incident(Base):
     __tablename__ = "incidents"
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.datetime.utcnow, index=True)
     latitude = Column(String)
     longitude = Column(String)
     severity = Column(String) # High, Medium, Low
@@ -44,7 +75,22 @@ class Admin(Base):
     password = Column(String)
 
 # Create the tables
-Base.metadata.create_all(bind=engine)
+def init_db(attempts=5):
+    # Every uvicorn worker runs this at import; if another worker is creating the schema (or switching
+    # the file to WAL) at the same moment we get "table already exists" / "database is locked", so retry
+    for attempt in range(attempts):
+        try:
+            Base.metadata.create_all(bind=engine)
+            # create_all does not add indexes to tables that already exist in safety.db
+            with engine.begin() as conn:
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_incidents_timestamp ON incidents (timestamp)"))
+            return
+        except OperationalError:
+            if attempt == attempts - 1:
+                raise
+            time.sleep(0.5)
+
+init_db()
 
 # Run this once on startup
 def create_default_admin():
@@ -54,11 +100,66 @@ def create_default_admin():
         # In real life, use bcrypt to hash this password
         default_admin = Admin(username="admin", password="police123")
         db.add(default_admin)
-        db.commit()
+        try:
+            db.commit()
+        except IntegrityError:
+            # Another uvicorn worker created it at the same time
+            db.rollback()
     db.close()
 
 create_default_admin()
 
+# One session per request, closed once the response is sent
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# --- Batched Incident Writes ---
+# SOS requests only enqueue their Incident; a background task commits them in batches
+INCIDENT_QUEUE = asyncio.Queue()
+INCIDENT_BATCH_SIZE = 50
+INCIDENT_FLUSH_INTERVAL = 0.2  # seconds
+
+def save_incidents(incidents):
+    db = SessionLocal()
+    try:
+        db.bulk_save_objects(incidents)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to save {len(incidents)} incident(s): {e}")
+    finally:
+        db.close()
+
+async def incident_writer():
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        # Wait for the first incident, then collect more until the batch is full or the interval expires
+        incident = await INCIDENT_QUEUE.get()
+        if incident is None:
+            # Shutdown sentinel: everything queued before it has already been saved
+            return
+        batch = [incident]
+        deadline = loop.time() + INCIDENT_FLUSH_INTERVAL
+        while len(batch) < INCIDENT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                incident = await asyncio.wait_for(INCIDENT_QUEUE.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if incident is None:
+                # Save the partial batch, then stop
+                stopping = True
+                break
+            batch.append(incident)
+        await asyncio.to_thread(save_incidents, batch)
+
 # This function runs before the Dashboard route. 
 # If the "admin-secret" header is wrong, it blocks the request.
 def verify_admin(admin_secret: str = Header(None)):
@@ -77,18 +178,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all methods (POST, GET, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["X-Total-Count"],  # Lets the dashboard read the total incident count
 )
 
+@app.on_event("startup")
+async def start_incident_writer():
+    app.state.incident_writer = asyncio.create_task(incident_writer())
+
+def create_scoring_executor():
+    # "spawn" so workers start clean instead of forking a process with a running event loop and
+    # ONNX Runtime thread pools; each worker primes librosa/numba once instead of on its first SOS request
+    executor = ProcessPoolExecutor(
+        max_workers=SCORING_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=warmup_feature_extraction
+    )
+    # Processes start lazily on submit, so kick them off now rather than on the first alert
+    for _ in range(SCORING_WORKERS):
+        executor.submit(int)
+    return executor
+
+@app.on_event("startup")
+async def start_scoring_executor():
+    app.state.scoring_executor = create_scoring_executor()
+
+@app.on_event("shutdown")
+async def stop_scoring_executor():
+    app.state.scoring_executor.shutdown(cancel_futures=True)
+
+@app.on_event("shutdown")
+async def stop_incident_writer():
+    # Queue a sentinel behind any pending incidents and wait for the writer to save them all,
+    # including a batch it is still collecting
+    INCIDENT_QUEUE.put_nowait(None)
+    await app.state.incident_writer
+
 class AdminUser(BaseModel):
     username: str
     password: str
 
 @app.post("/api/v1/login")
-def login(creds: AdminUser):
-    db = SessionLocal()
-
+def login(creds: AdminUser, db: Session = Depends(get_db)):
     user = db.query(Admin).filter(Admin.username == creds.username).first()
-    db.close()
 
     if not user or user.password != creds.password:
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -109,6 +240,21 @@ class RiskScoreOut(BaseModel):
     message: str
     details: dict
 
+async def extract_audio_features(audio_path):
+    """Runs extract_features_for_inference in the scoring pool; returns None if it fails."""
+    executor = app.state.scoring_executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, extract_features_for_inference, audio_path)
+    except BrokenProcessPool:
+        # A worker died (e.g. a decoder crashed on this upload); the pool rejects all further work,
+        # so replace it once (other requests may hit the same broken pool) and carry on without audio
+        print("Scoring worker died, restarting the scoring pool")
+        if app.state.scoring_executor is executor:
+            app.state.scoring_executor = create_scoring_executor()
+            executor.shutdown(wait=False, cancel_futures=True)
+        return None
+
 def simulate_email_alert(email_to, severity, location, link):
     print("\n" + "="*40)
     print(f"📧 [SIMULATION] SENDING EMAIL TO: {email_to}")
@@ -144,26 +290,38 @@ async def sos_alert_endpoint(
                 shutil.copyfileobj(audio_file.file, buffer)
         
         # 2. RUN AI-BASED RISK SCORING (Calls the function in risk_scorer.py)
-        severity, confidence, details = calculate_risk_score(
-            audio_file_path=audio_path,
-            text_input=text_message
+        # Audio features are extracted in the scoring pool so the event loop is not blocked
+        audio_features = None
+        audio_failed = False
+        if audio_path and extract_features_for_inference is not None:
+            audio_features = await extract_audio_features(audio_path)
+            audio_failed = audio_features is None
+
+        # If extraction failed, score the text alone rather than retrying the audio in this process
+        severity, confidence, details = await asyncio.to_thread(
+            calculate_risk_score,
+            None if audio_failed else audio_path,
+            text_message,
+            audio_features
         )
+        if audio_failed:
+            details["audio_error"] = "Audio processing failed (Codec/FFmpeg issue)"
 
         # --- SAVE TO DB ---
-        db = SessionLocal()
+        # Queued for the background writer; the response does not wait for the commit
+        latitude = location_data.split(',')[0] if ',' in location_data else "0.0"
+        longitude = location_data.split(',')[1] if ',' in location_data else "0.0"
         new_incident = Incident(
-            latitude=location_data.split(',')[0] if ',' in location_data else "0.0",
-            longitude=location_data.split(',')[1] if ',' in location_data else "0.0",
+            latitude=latitude,
+            longitude=longitude,
             severity=severity,
-            details=str(details)
+            details=str(details),
+            timestamp=datetime.datetime.utcnow()
         )
-        db.add(new_incident)
-        db.commit()
-        db.refresh(new_incident)
-        db.close()
+        INCIDENT_QUEUE.put_nowait(new_incident)
 
         if severity == "High" or severity == "Medium":
-            google_maps_link = f"https://www.google.com/maps/search/?api=1&query={new_incident.latitude},{new_incident.longitude}"
+            google_maps_link = f"https://www.google.com/maps/search/?api=1&query={latitude},{longitude}"
             simulate_email_alert("police@emergency.com", severity, location_data, google_maps_link)
 
         # 3. Construct Response
@@ -185,11 +343,22 @@ async def sos_alert_endpoint(
 
 
 @app.get("/api/v1/incidents", dependencies=[Depends(verify_admin)])
-def get_incidents():
-    db = SessionLocal()
-    incidents = db.query(Incident).all()
-    db.close()
-    return incidents
+def get_incidents(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of incidents to return"),
+    offset: int = Query(0, ge=0, description="Number of incidents to skip"),
+    db: Session = Depends(get_db)
+):
+    # The body holds one page; the total is reported separately so clients can show it
+    response.headers["X-Total-Count"] = str(db.scalar(select(func.count()).select_from(Incident)))
+    # Newest first, one page at a time (id breaks timestamp ties so pages don't overlap)
+    query = (
+        select(Incident)
+        .order_by(Incident.timestamp.desc(), Incident.id.desc())
+        .limit(limit)
+        .offset(offset)
+    )
+    return db.execute(query).scalars().all()
 
 # --- Run the application (Local Development) ---
 #if __name__ == "__main__":
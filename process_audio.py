@@ -1,46 +1,63 @@
-import librosa
 import soundfile as sf
 import os
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from numba import njit
 
 # Define the required duration in seconds
-TARGET_DURATION = 3.0 
+TARGET_DURATION = 3.0
 
 # Path to your TESS data (adjust if needed)
-DATA_PATH = 'data/' 
+DATA_PATH = 'data/'
 
 # New folder for processed 3.0s files
-PROCESSED_PATH = 'processed_data/' 
+PROCESSED_PATH = 'processed_data/'
 os.makedirs(PROCESSED_PATH, exist_ok=True)
 
-print("Starting audio standardization...")
-
-for root, dirs, files in os.walk(DATA_PATH):
-    for file in files:
-        if file.endswith('.wav'):
-            file_path = os.path.join(root, file)
-
-            # 1. Load the audio file
-            # sr=None preserves the original sampling rate
-            audio, sr = librosa.load(file_path, sr=None) 
-
-            # Calculate the number of samples for the target duration
-            target_samples = int(TARGET_DURATION * sr)
-
-            if len(audio) > target_samples:
-                # 2. Trim: Audio is too long, trim to target_samples
-                audio_processed = audio[:target_samples]
-            elif len(audio) < target_samples:
-                # 3. Pad: Audio is too short, pad with zeros
-                padding_length = target_samples - len(audio)
-                audio_processed = np.pad(audio, (0, padding_length), 'constant')
-            else:
-                # 4. Correct length
-                audio_processed = audio
-
-            # 5. Save the standardized file to the new folder
-            # The filename (which contains the emotion label) remains the same
-            new_file_path = os.path.join(PROCESSED_PATH, file)
-            sf.write(new_file_path, audio_processed, sr)
-
-print("Audio standardization complete! Files saved to:", PROCESSED_PATH)
\ No newline at end of file
+@njit(cache=True, fastmath=True)
+def fit_length(audio, target_samples):
+    """Trims or zero-pads audio to exactly target_samples in a single preallocated buffer."""
+    out = np.zeros(target_samples, dtype=np.float32)
+    n = min(audio.shape[0], target_samples)
+    out[:n] = audio[:n]
+    return out
+
+def process_one(file_path):
+    """Trims/pads a single .wav file to TARGET_DURATION and saves it to PROCESSED_PATH."""
+    # 1. Load the audio file
+    # soundfile reads WAV natively at its original sampling rate
+    audio, sr = sf.read(file_path, dtype='float32', always_2d=False)
+    if audio.ndim > 1:
+        # Downmix multi-channel recordings to mono
+        audio = audio.mean(axis=1)
+
+    # Calculate the number of samples for the target duration
+    target_samples = int(TARGET_DURATION * sr)
+
+    # 2. Trim or pad to target_samples
+    audio_processed = fit_length(np.ascontiguousarray(audio, dtype=np.float32), target_samples)
+
+    # 3. Save the standardized file to the new folder
+    # The filename (which contains the emotion label) remains the same
+    new_file_path = os.path.join(PROCESSED_PATH, os.path.basename(file_path))
+    sf.write(new_file_path, audio_processed, sr)
+
+if __name__ == "__main__":
+    print("Starting audio standardization...")
+
+    # Compile fit_length once up front; cache=True lets the worker processes reuse it from disk
+    fit_length(np.zeros(1, dtype=np.float32), 1)
+
+    # Collect every .wav path first so the work can be split across processes
+    paths = [
+        os.path.join(root, file)
+        for root, dirs, files in os.walk(DATA_PATH)
+        for file in files
+        if file.endswith('.wav')
+    ]
+
+    # Each file is independent, so standardize them on all available cores
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+        list(executor.map(process_one, paths, chunksize=16))
+
+    print("Audio standardization complete! Files saved to:", PROCESSED_PATH)
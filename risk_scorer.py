@@ -1,116 +1,93 @@
 import joblib
-import librosa
-import shutil
 import numpy as np
 import os
-from transformers import pipeline
+import re
+import onnxruntime as ort
+from transformers import AutoConfig, AutoTokenizer
 from typing import Optional, Tuple, Dict
-import subprocess
+from export_text_model import TEXT_MODEL_DIR, TEXT_MODEL_FILE
+from sklearn.pipeline import Pipeline
+# Decoding and feature extraction live in audio_features.py so worker processes can import them without the models
+from audio_features import extract_features_for_inference
 
-# --- Global Configurations (Must match train_model.py) ---
-TARGET_DURATION = 3.0 
-N_MFCC = 40
-SAMPLE_RATE = 22050
+# --- Global Configurations ---
 DISTRESS_AUDIO_LABELS = ["fear", "angry", "disgust", "sad"]
 DISTRESS_TEXT_LABELS = ['NEGATIVE'] 
+# Messages containing any of these words are scored as distress without running the text model
+DISTRESS_RE = re.compile(r'\b(help|fire|gun|attack|assault|rape|kidnap|emergency|sos)\b', re.IGNORECASE)
+DISTRESS_KEYWORD_CONFIDENCE = 0.95
 
 # --- Load Assets ---
+AUDIO_PIPELINE_PATH = 'audio_pipeline.joblib'
 try:
-    # Load the trained model and scaler
-    AUDIO_MODEL = joblib.load('audio_distress_model.joblib')
-    FEATURE_SCALER = joblib.load('feature_scaler.joblib')
+    if os.path.exists(AUDIO_PIPELINE_PATH):
+        # Memory-map the scaler + MLP weights so uvicorn workers share the same pages
+        # (only while AUDIO_SESSION below is absent; otherwise just classes_ is read from it)
+        AUDIO_PIPELINE = joblib.load(AUDIO_PIPELINE_PATH, mmap_mode='r')
+    else:
+        # Fall back to the separately saved model and scaler (also memory-mapped)
+        AUDIO_PIPELINE = Pipeline([
+            ('scaler', joblib.load('feature_scaler.joblib', mmap_mode='r')),
+            ('mlp', joblib.load('audio_distress_model.joblib', mmap_mode='r'))
+        ])
 except Exception as e:
     print(f"Error loading AI assets: {e}")
-    AUDIO_MODEL = None
-    FEATURE_SCALER = None
+    AUDIO_PIPELINE = None
 
-# Initialize Hugging Face Text Classifier Pipeline
+# INT8-quantized ONNX export of the same pipeline (written by train_model.py), preferred when present.
+# ONNX Runtime keeps its own private copy of the weights in every process that loads it
+AUDIO_ONNX_PATH = 'audio_pipeline_int8.onnx'
 try:
-    TEXT_CLASSIFIER = pipeline(
-        "zero-shot-classification", 
-        model="facebook/bart-large-mnli"
+    AUDIO_SESSION = (
+        ort.InferenceSession(AUDIO_ONNX_PATH, providers=['CPUExecutionProvider'])
+        if os.path.exists(AUDIO_ONNX_PATH) else None
     )
-    # Define text labels for zero-shot classification
-    TEXT_CANDIDATE_LABELS = ["distress", "safety check", "neutral"]
 except Exception as e:
-    print(f"Error loading Hugging Face pipeline: {e}")
-    TEXT_CLASSIFIER = None
-
-
-def convert_to_wav(input_path, output_path="converted.wav"):
-    try:
-        # If ffmpeg is on PATH, use that.
-        ffmpeg_cmd = shutil.which("ffmpeg")
-
-        result = subprocess.run([
-            ffmpeg_cmd, "-y",
-            "-i", input_path,
-            "-ar", str(SAMPLE_RATE),
-            "-ac", "1",
-            output_path
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-        if result.returncode != 0:
-            print("FFmpeg error:", result.stderr)
-            return None
-
-        return output_path
-
-    except Exception as e:
-        print("FFmpeg conversion failed:", e)
-        return None
-
-# --- Feature Extraction Function ---
-def extract_features_for_inference(file_path: str, sample_rate: int = SAMPLE_RATE) -> Optional[np.ndarray]:
-    """Extracts features from a single new audio file."""
-    try:
-        # Convert WebM/OGG → WAV
-        wav_path = convert_to_wav(file_path)
-        if not wav_path:
-            print("Audio conversion failed")
-            return None
-
-        audio, sr = librosa.load(wav_path, sr=sample_rate)
-        # Pad or trim audio to exactly TARGET_DURATION
-        required_len = int(TARGET_DURATION * sample_rate)
-        if len(audio) < required_len:
-            audio = np.pad(audio, (0, required_len - len(audio)))
-        else:
-            audio = audio[:required_len]
-        
-        # 1. MFCCs
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=N_MFCC)
-        mfccs_mean = np.mean(mfccs.T, axis=0)
-        mfccs_stdev = np.std(mfccs.T, axis=0)
-        
-        # 2. Chroma
-        chroma = librosa.feature.chroma_stft(y=audio, sr=sr)
-        chroma_mean = np.mean(chroma.T, axis=0)
-        chroma_stdev = np.std(chroma.T, axis=0)
-
-        # 3. Mel Spectrogram
-        mel = librosa.feature.melspectrogram(y=audio, sr=sr)
-        mel_mean = np.mean(mel.T, axis=0)
-        mel_stdev = np.std(mel.T, axis=0)
-        
-        feature_vector = np.hstack([
-            mfccs_mean, mfccs_stdev, 
-            chroma_mean, chroma_stdev, 
-            mel_mean, mel_stdev
-        ])
-        
-        # Reshape for single prediction (1 sample, N features)
-        return feature_vector.reshape(1, -1)
-        
-    except Exception as e:
-        # If audio fails (e.g., missing FFmpeg), return None so we can fallback to text
-        print(f"Feature extraction failed: {e}")
-        return None
+    print(f"Error loading ONNX audio model: {e}")
+    AUDIO_SESSION = None
+
+# Distilled SST-2 sentiment model served through ONNX Runtime (INT8, loaded lazily on first use).
+# The model is exported ahead of time by export_text_model.py.
+TEXT_CLASSIFIER = None
+# Set once loading fails so later requests don't retry the (slow) load every time
+TEXT_CLASSIFIER_FAILED = False
+
+
+def get_text_classifier():
+    """Loads the quantized text classifier on first call and caches it for later requests.
+
+    Returns: (ONNX Runtime session, tokenizer, id2label) or None if unavailable.
+    """
+    global TEXT_CLASSIFIER, TEXT_CLASSIFIER_FAILED
+    if TEXT_CLASSIFIER is None and not TEXT_CLASSIFIER_FAILED:
+        try:
+            model_path = os.path.join(TEXT_MODEL_DIR, TEXT_MODEL_FILE)
+            if not os.path.exists(model_path):
+                raise FileNotFoundError(f"{model_path} not found, run `python export_text_model.py` first")
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            tokenizer = AutoTokenizer.from_pretrained(TEXT_MODEL_DIR)
+            id2label = AutoConfig.from_pretrained(TEXT_MODEL_DIR).id2label
+            TEXT_CLASSIFIER = (session, tokenizer, id2label)
+        except Exception as e:
+            print(f"Error loading ONNX text classifier: {e}")
+            TEXT_CLASSIFIER = None
+            TEXT_CLASSIFIER_FAILED = True
+    return TEXT_CLASSIFIER
+
 
 # --- Core Scoring Function (Called by FastAPI) ---
-def calculate_risk_score(audio_file_path: Optional[str] = None, text_input: Optional[str] = None) -> Tuple[str, float, Dict]:
+def calculate_risk_score(
+    audio_file_path: Optional[str] = None,
+    text_input: Optional[str] = None,
+    audio_features: Optional[np.ndarray] = None
+) -> Tuple[str, float, Dict]:
     """
     Calculates the final severity score based on audio and optional text confidence.
+    audio_features: features already extracted from audio_file_path (e.g. in a worker process);
+    they are extracted here when not given.
     Returns: (Severity_Level, Final_Confidence, Details)
     """
     
@@ -121,15 +98,17 @@ def calculate_risk_score(audio_file_path: Optional[str] = None, text_input: Opti
     details = {}
 
     # 1. AUDIO CLASSIFICATION
-    if audio_file_path and AUDIO_MODEL and FEATURE_SCALER:
-        features = extract_features_for_inference(audio_file_path)
+    if audio_file_path and AUDIO_PIPELINE is not None:
+        features = audio_features if audio_features is not None else extract_features_for_inference(audio_file_path)
         
         if features is not None:
-            # Scale features
-            features_scaled = FEATURE_SCALER.transform(features)
-            # Get probabilities
-            probabilities = AUDIO_MODEL.predict_proba(features_scaled)[0]
-            class_labels = AUDIO_MODEL.classes_
+            # Scale features and get probabilities in one pass
+            if AUDIO_SESSION is not None:
+                # Outputs are (label, probabilities)
+                probabilities = AUDIO_SESSION.run(None, {'x': features})[1][0]
+            else:
+                probabilities = AUDIO_PIPELINE.predict_proba(features)[0]
+            class_labels = AUDIO_PIPELINE.classes_
             
             # Find max distress confidence
             for label, proba in zip(class_labels, probabilities):
@@ -142,15 +121,28 @@ def calculate_risk_score(audio_file_path: Optional[str] = None, text_input: Opti
         print(f"[LOG] Audio classification result: {audio_emotion} with confidence {audio_confidence:.2f}")
 
     # 2. TEXT CLASSIFICATION
-    if text_input and TEXT_CLASSIFIER:
-        try:
-            results = TEXT_CLASSIFIER(text_input, TEXT_CANDIDATE_LABELS, multi_label=False)
-            if 'distress' in results['labels']:
-                distress_index = results['labels'].index('distress')
-                text_confidence = results['scores'][distress_index]
-        except Exception as e:
-            print(f"Text analysis error: {e}")
-        print(f"[LOG] Text classification result: {text_confidence:.2f} confidence for distress.")
+    if text_input and DISTRESS_RE.search(text_input):
+        # Obvious distress keyword: skip the model entirely
+        text_confidence = DISTRESS_KEYWORD_CONFIDENCE
+        print(f"[LOG] Text keyword match: {text_confidence:.2f} confidence for distress.")
+    elif text_input:
+        text_classifier = get_text_classifier()
+        if text_classifier:
+            try:
+                session, tokenizer, id2label = text_classifier
+                input_names = {i.name for i in session.get_inputs()}
+                encoded = tokenizer(text_input, return_tensors="np", truncation=True)
+                logits = session.run(None, {k: v for k, v in encoded.items() if k in input_names})[0][0]
+                # Softmax over the sentiment logits
+                scores = np.exp(logits - logits.max())
+                scores /= scores.sum()
+                # Treat NEGATIVE sentiment as distress
+                text_confidence = float(sum(
+                    score for idx, score in enumerate(scores) if id2label[idx] in DISTRESS_TEXT_LABELS
+                ))
+            except Exception as e:
+                print(f"Text analysis error: {e}")
+            print(f"[LOG] Text classification result: {text_confidence:.2f} confidence for distress.")
 
     # 3. FINAL CONFIDENCE-BASED RISK MAPPING
     # Use the max confidence from the two inputs
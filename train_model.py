@@ -5,14 +5,18 @@ from sklearn.model_selection import train_test_split
 from sklearn.neural_network import MLPClassifier
 from sklearn.metrics import accuracy_score
 from sklearn.preprocessing import StandardScaler
+from sklearn.pipeline import Pipeline
 import joblib
-
-# Global Parameters (Shared with risk_scorer.py)
+from joblib import Parallel, delayed
+import onnx
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+import onnxruntime as ort
+from onnxruntime.quantization import quantize_dynamic, QuantType
+from audio_features import SAMPLE_RATE, TARGET_DURATION, compute_features
+
+# Global Parameters (feature parameters are shared with risk_scorer.py via audio_features.py)
 PROCESSED_PATH = 'processed_data/' 
-TARGET_DURATION = 3.0 
-N_MFCC = 40  # Number of MFCCs to extract
-# Setting a high sample rate ensures quality but requires more memory
-SAMPLE_RATE = 22050 
 
 def extract_features(file_path, sample_rate=SAMPLE_RATE):
     """Loads audio, extracts various features (MFCCs, Chroma, Mel), and combines them."""
@@ -20,27 +24,8 @@ def extract_features(file_path, sample_rate=SAMPLE_RATE):
         # Load the 3.0s audio file with the defined sample rate
         audio, sr = librosa.load(file_path, sr=sample_rate, duration=TARGET_DURATION)
         
-        # 1. MFCCs (Mel-Frequency Cepstral Coefficients)
-        mfccs = librosa.feature.mfcc(y=audio, sr=sr, n_mfcc=N_MFCC)
-        mfccs_mean = np.mean(mfccs.T, axis=0)
-        mfccs_stdev = np.std(mfccs.T, axis=0)
-        
-        # 2. Chroma (measures intensity of pitches)
-        chroma = librosa.feature.chroma_stft(y=audio, sr=sr)
-        chroma_mean = np.mean(chroma.T, axis=0)
-        chroma_stdev = np.std(chroma.T, axis=0)
-
-        # 3. Mel Spectrogram (representation of sound)
-        mel = librosa.feature.melspectrogram(y=audio, sr=sr)
-        mel_mean = np.mean(mel.T, axis=0)
-        mel_stdev = np.std(mel.T, axis=0)
-        
-        # Combine all mean and standard deviation features into one vector
-        feature_vector = np.hstack([
-            mfccs_mean, mfccs_stdev, 
-            chroma_mean, chroma_stdev, 
-            mel_mean, mel_stdev
-        ])
+        # MFCCs, Chroma and Mel mean/std combined into one vector
+        feature_vector = compute_features(audio, sr)
         
         return feature_vector
         
@@ -49,22 +34,26 @@ def extract_features(file_path, sample_rate=SAMPLE_RATE):
         return None
 
 # Load all standardized data
-features = []
-labels = []
+filenames = [f for f in os.listdir(PROCESSED_PATH) if f.endswith('.wav')]
+paths = [os.path.join(PROCESSED_PATH, f) for f in filenames]
+file_labels = [f.split('_')[1] for f in filenames]
 
 print("Extracting enhanced features (MFCCs, Chroma, Mel) from 3.0s audio clips...")
-for filename in os.listdir(PROCESSED_PATH):
-    if filename.endswith('.wav'):
-        file_path = os.path.join(PROCESSED_PATH, filename)
-        label = filename.split('_')[1] 
-
-        feature = extract_features(file_path)
+# Feature extraction is STFT-bound and independent per file, so spread it across all cores
+extracted = Parallel(n_jobs=-1, backend='loky', batch_size=32)(
+    delayed(extract_features)(p) for p in paths
+)
 
-        if feature is not None:
-            features.append(feature)
-            labels.append(label)
+# Drop files whose feature extraction failed
+features = []
+labels = []
+for feature, label in zip(extracted, file_labels):
+    if feature is not None:
+        features.append(feature)
+        labels.append(label)
 
-X = np.array(features)
+# float32 features make the scaler and MLP store/compute in fp32 (matches risk_scorer.py)
+X = np.array(features, dtype=np.float32)
 y = np.array(labels)
 
 print(f"Total samples processed: {len(X)}")
@@ -104,8 +93,42 @@ print(f"Model Training Complete. New Test Accuracy: {accuracy*100:.2f}%")
 # 5. Save the Model AND the Scaler
 MODEL_FILENAME = 'audio_distress_model.joblib'
 SCALER_FILENAME = 'feature_scaler.joblib'
+PIPELINE_FILENAME = 'audio_pipeline.joblib'
+ONNX_FILENAME = 'audio_pipeline.onnx'
+ONNX_INT8_FILENAME = 'audio_pipeline_int8.onnx'
+# Largest test-accuracy loss accepted from INT8 quantization before falling back to fp32
+MAX_INT8_ACCURACY_DROP = 0.01
+
+# Saved uncompressed (compress=0) so risk_scorer.py can memory-map them and share pages across workers
+# (when the ONNX model below is not used)
+joblib.dump(audio_model, MODEL_FILENAME, compress=0)
+joblib.dump(scaler, SCALER_FILENAME, compress=0)
+# Combined scaler + model used by risk_scorer.py
+audio_pipeline = Pipeline([('scaler', scaler), ('mlp', audio_model)])
+joblib.dump(audio_pipeline, PIPELINE_FILENAME, compress=0)
+
+# 6. Export the pipeline to ONNX and quantize its weights to INT8 for ONNX Runtime inference
+# zipmap=False makes the probabilities output a plain (n_samples, n_classes) array
+onnx_model = convert_sklearn(
+    audio_pipeline,
+    initial_types=[('x', FloatTensorType([None, X.shape[1]]))],
+    options={id(audio_model): {'zipmap': False}}
+)
+onnx.save(onnx_model, ONNX_FILENAME)
+quantize_dynamic(ONNX_FILENAME, ONNX_INT8_FILENAME, weight_type=QuantType.QInt8)
+
+# 7. Evaluate the INT8 model too, since risk_scorer.py prefers it over the fp32 pipeline
+int8_session = ort.InferenceSession(ONNX_INT8_FILENAME, providers=['CPUExecutionProvider'])
+int8_pred = int8_session.run(None, {'x': X_test})[0]
+int8_accuracy = accuracy_score(y_test, int8_pred)
+print(f"INT8 ONNX Test Accuracy: {int8_accuracy*100:.2f}% (fp32: {accuracy*100:.2f}%)")
 
-joblib.dump(audio_model, MODEL_FILENAME)
-joblib.dump(scaler, SCALER_FILENAME)
 print(f"Trained model saved as {MODEL_FILENAME}")
-print(f"Feature scaler saved as {SCALER_FILENAME}")
\ No newline at end of file
+print(f"Feature scaler saved as {SCALER_FILENAME}")
+print(f"Inference pipeline saved as {PIPELINE_FILENAME}")
+if accuracy - int8_accuracy > MAX_INT8_ACCURACY_DROP:
+    # Don't ship a quantized model that is noticeably worse; risk_scorer.py then uses the fp32 pipeline
+    os.remove(ONNX_INT8_FILENAME)
+    print(f"INT8 ONNX pipeline discarded: accuracy dropped by more than {MAX_INT8_ACCURACY_DROP*100:.0f} points")
+else:
+    print(f"INT8 ONNX pipeline saved as {ONNX_INT8_FILENAME}")
\ No newline at end of file